@@ -1,19 +1,27 @@
-"""Valkey/Redis cache for URL analysis results."""
+"""Valkey/Redis cache for URL analysis and folder recommendation results."""
 
 import contextlib
 import hashlib
 import os
+from typing import TypeVar
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import redis.asyncio as redis
+from pydantic import BaseModel
 from redis.exceptions import RedisError
 
-from app.schemas.analyze import AnalyzeUrlResponse
+from app.schemas.analyze import AnalyzeUrlResponse, RecommendationResponse
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
-ANALYSIS_TTL = 60 * 60  # 1 hour
+ANALYSIS_TTL = 24 * 60 * 60  # 24 hours
+RECOMMENDATION_TTL = 60 * 60  # 1 hour
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "mc_cid", "mc_eid", "ref_src"})
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
 _client: redis.Redis | None = None
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
 
 def _get_client() -> redis.Redis:
     global _client
@@ -22,22 +30,73 @@ def _get_client() -> redis.Redis:
     return _client
 
 
+def _normalize_url(url: str) -> str:
+    """Canonicalize a URL so trivially different spellings of the same page share a cache entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if ":" in netloc:
+        netloc = f"[{netloc}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(query), ""))
+
+
 def _cache_key(url: str) -> str:
-    return f"analysis:{hashlib.sha256(url.encode()).hexdigest()}"
+    return f"analysis:{hashlib.sha256(_normalize_url(url).encode()).hexdigest()}"
 
 
-async def get_analysis(url: str) -> AnalyzeUrlResponse | None:
-    """Return cached analysis for a URL, or None on miss/error."""
+def _recommendation_key(analysis: AnalyzeUrlResponse, folders_toon: str, create_new_folder: bool) -> str:
+    digest = hashlib.sha256()
+    for part in (analysis.model_dump_json(), folders_toon, str(create_new_folder)):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return f"recommendation:{digest.hexdigest()}"
+
+
+async def _get(key: str, model: type[ModelT]) -> ModelT | None:
     try:
-        data = await _get_client().get(_cache_key(url))
+        data = await _get_client().get(key)
         if data is not None:
-            return AnalyzeUrlResponse.model_validate_json(data)
+            return model.model_validate_json(data)
     except (RedisError, OSError):
         pass
     return None
 
 
+async def _set(key: str, ttl: int, value: BaseModel) -> None:
+    with contextlib.suppress(RedisError, OSError):
+        await _get_client().setex(key, ttl, value.model_dump_json())
+
+
+async def get_analysis(url: str) -> AnalyzeUrlResponse | None:
+    """Return cached analysis for a URL, or None on miss/error."""
+    return await _get(_cache_key(url), AnalyzeUrlResponse)
+
+
 async def set_analysis(url: str, analysis: AnalyzeUrlResponse) -> None:
     """Cache an analysis result with TTL. Silently ignores errors."""
-    with contextlib.suppress(RedisError, OSError):
-        await _get_client().setex(_cache_key(url), ANALYSIS_TTL, analysis.model_dump_json())
+    await _set(_cache_key(url), ANALYSIS_TTL, analysis)
+
+
+async def get_recommendation(
+    analysis: AnalyzeUrlResponse, folders_toon: str, create_new_folder: bool
+) -> RecommendationResponse | None:
+    """Return a cached recommendation for an analysis and folder tree, or None on miss/error."""
+    return await _get(_recommendation_key(analysis, folders_toon, create_new_folder), RecommendationResponse)
+
+
+async def set_recommendation(
+    analysis: AnalyzeUrlResponse, folders_toon: str, create_new_folder: bool, recommendation: RecommendationResponse
+) -> None:
+    """Cache a recommendation result with TTL. Silently ignores errors."""
+    await _set(_recommendation_key(analysis, folders_toon, create_new_folder), RECOMMENDATION_TTL, recommendation)
@@ -1,17 +1,18 @@
 """Searchmark CLI — get folder recommendations for bookmarks."""
 
 import asyncio
+from collections.abc import Coroutine
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any
 
+import orjson
 import typer
 from dotenv import load_dotenv
 from rich.columns import Columns
 from rich.console import Console
 from rich.panel import Panel
 
-from app.main import fetch_and_analyze_url, get_folder_recommendation
-from app.parsers import folders_to_json, parse_bookmarks_file
+from app.parsers import folders_to_toon, parse_bookmarks_file
 from app.schemas.analyze import RecommendationResponse
 
 load_dotenv(".envs/.local/.fastapi")
@@ -21,6 +22,17 @@ console = Console(stderr=True)
 stdout = Console()
 
 
+async def _with_http_client(coro: Coroutine[Any, Any, None]) -> None:
+    # app.main pulls in litellm, which takes seconds to import, so commands import it lazily
+    # to keep --help and argument errors instant.
+    from app.main import close_http_client
+
+    try:
+        await coro
+    finally:
+        await close_http_client()
+
+
 def _format_recommendation(rec: RecommendationResponse) -> list[str]:
     lines = [
         f"[bold]Title:[/bold] {rec.title}",
@@ -41,17 +53,16 @@ def recommend(
     ] = Path("fixtures/bookmarks.json"),
     new_folder: Annotated[bool, typer.Option("--new-folder", "-n", help="Suggest creating a new folder")] = False,
 ) -> None:
-    asyncio.run(_recommend(url, bookmarks, new_folder))
+    asyncio.run(_with_http_client(_recommend(url, bookmarks, new_folder)))
 
 
 async def _recommend(url: str, bookmarks: Path, new_folder: bool) -> None:
-    folders = parse_bookmarks_file(bookmarks)
+    from app.main import recommend_url
 
-    console.print(f"[dim]Analyzing {url}...[/dim]")
-    analysis = await fetch_and_analyze_url(url)
+    folders = parse_bookmarks_file(bookmarks)
 
-    console.print("[dim]Getting recommendation...[/dim]")
-    recommendation = await get_folder_recommendation(analysis, folders_to_json(folders), new_folder)
+    console.print(f"[dim]Getting recommendation for {url}...[/dim]")
+    recommendation = await recommend_url(url, folders, new_folder)
 
     stdout.print(Panel("\n".join(_format_recommendation(recommendation)), title="Recommendation"))
 
@@ -64,20 +75,22 @@ def compare(
     ] = Path("fixtures/bookmarks.json"),
 ) -> None:
     """Compare existing-folder vs new-folder recommendations (single URL analysis)."""
-    asyncio.run(_compare(url, bookmarks))
+    asyncio.run(_with_http_client(_compare(url, bookmarks)))
 
 
 async def _compare(url: str, bookmarks: Path) -> None:
+    from app.main import fetch_and_analyze_url, get_folder_recommendation
+
     folders = parse_bookmarks_file(bookmarks)
-    folders_json = folders_to_json(folders)
+    folders_toon = folders_to_toon(folders)
 
     console.print(f"[dim]Analyzing {url}...[/dim]")
     analysis = await fetch_and_analyze_url(url)
 
     console.print("[dim]Getting both recommendations...[/dim]")
     existing, new = await asyncio.gather(
-        get_folder_recommendation(analysis, folders_json, create_new_folder=False),
-        get_folder_recommendation(analysis, folders_json, create_new_folder=True),
+        get_folder_recommendation(analysis, folders_toon, create_new_folder=False),
+        get_folder_recommendation(analysis, folders_toon, create_new_folder=True),
     )
 
     stdout.print(
@@ -89,3 +102,36 @@ async def _compare(url: str, bookmarks: Path) -> None:
             equal=True,
         )
     )
+
+
+@app.command()
+def recommend_batch(
+    urls_file: Annotated[Path, typer.Option("--urls-file", "-u", help="Text file with one URL per line", exists=True)],
+    bookmarks: Annotated[
+        Path, typer.Option("--bookmarks", "-b", help="Bookmarks file (JSON or HTML)", exists=True)
+    ] = Path("fixtures/bookmarks.json"),
+    new_folder: Annotated[bool, typer.Option("--new-folder", "-n", help="Suggest creating a new folder")] = False,
+    concurrency: Annotated[int, typer.Option("--concurrency", "-c", help="Maximum URLs processed at once", min=1)] = 20,
+) -> None:
+    """Recommend folders for many URLs concurrently, printing one JSON line per URL as it completes."""
+    asyncio.run(_with_http_client(_recommend_batch(urls_file, bookmarks, new_folder, concurrency)))
+
+
+async def _recommend_batch(urls_file: Path, bookmarks: Path, new_folder: bool, concurrency: int) -> None:
+    from app.main import recommend_url
+
+    urls = [line.strip() for line in urls_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    folders = parse_bookmarks_file(bookmarks)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def recommend_one(url: str) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                recommendation = await recommend_url(url, folders, new_folder)
+            except Exception as exc:
+                return {"url": url, "error": str(exc)}
+        return {"url": url, **recommendation.model_dump()}
+
+    console.print(f"[dim]Getting recommendations for {len(urls)} URLs...[/dim]")
+    for result in asyncio.as_completed([recommend_one(url) for url in urls]):
+        typer.echo(orjson.dumps(await result).decode())
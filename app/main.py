@@ -1,39 +1,148 @@
-import json
+import asyncio
+import hashlib
+import ipaddress
+import re
+import socket
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import TypeVar
 from urllib.parse import urlparse
 
-import html2text
 import httpx
 import litellm
-from fastapi import FastAPI, HTTPException
-from litellm import acompletion
-from toon import encode as toon_encode
+import orjson
+from fastapi import FastAPI, HTTPException, Response
+from litellm import Router
+from litellm.types.llms.openai import AllMessageValues, ChatCompletionSystemMessage
+from pydantic import BaseModel
+from selectolax.lexbor import LexborHTMLParser
 
 from app.schemas.analyze import (
     AnalyseUrlRequest,
     AnalyzeUrlResponse,
     ExistingFolderRecommendation,
+    Folder,
+    FusedExistingFolderRecommendation,
+    FusedNewFolderRecommendation,
     NewFolderRecommendation,
     RecommendationResponse,
 )
 
 from . import cache
-from .prompts import EXISTING_FOLDER_RECOMMENDATION_PROMPT, NEW_FOLDER_RECOMMENDATION_PROMPT
+from .parsers import folders_to_toon
+from .prompts import (
+    ANALYSIS_PROMPT,
+    ANALYZE_PAGE_FIRST_PROMPT,
+    EXISTING_FOLDER_RECOMMENDATION_PROMPT,
+    NEW_FOLDER_RECOMMENDATION_PROMPT,
+)
 
-BLOCKED_HOSTS = {"localhost", "127.0.0.1", "::1"}
+BLOCKED_HOSTS = frozenset({"localhost", "127.0.0.1", "::1"})
+BLOCKED_HOST_CACHE_TTL = 300.0
+BLOCKED_HOST_CACHE_SIZE = 1024
+MAX_HTML_BYTES = 256 * 1024
+MAX_CONTENT_TOKENS = 2048
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "nav", "footer"]
 MODEL = "openai/gpt-4.1"
+LLM_MAX_PARALLEL_REQUESTS = 64
+
+# Constant system messages are built once so every request sends the exact same prompt prefix.
+_ANALYSIS_SYSTEM_MESSAGE: ChatCompletionSystemMessage = {"role": "system", "content": ANALYSIS_PROMPT}
+_EXISTING_FOLDER_SYSTEM_MESSAGE: ChatCompletionSystemMessage = {
+    "role": "system",
+    "content": EXISTING_FOLDER_RECOMMENDATION_PROMPT,
+}
+_NEW_FOLDER_SYSTEM_MESSAGE: ChatCompletionSystemMessage = {
+    "role": "system",
+    "content": NEW_FOLDER_RECOMMENDATION_PROMPT,
+}
+_FUSED_EXISTING_FOLDER_SYSTEM_MESSAGE: ChatCompletionSystemMessage = {
+    "role": "system",
+    "content": EXISTING_FOLDER_RECOMMENDATION_PROMPT + ANALYZE_PAGE_FIRST_PROMPT,
+}
+_FUSED_NEW_FOLDER_SYSTEM_MESSAGE: ChatCompletionSystemMessage = {
+    "role": "system",
+    "content": NEW_FOLDER_RECOMMENDATION_PROMPT + ANALYZE_PAGE_FIRST_PROMPT,
+}
+# Both system messages (instructions, folder tree) are cache breakpoints for providers with explicit caching.
+_CACHE_CONTROL_INJECTION_POINTS = [{"location": "message", "role": "system"}]
+
+_http_client: httpx.AsyncClient | None = None
+_router = Router(
+    model_list=[
+        {
+            "model_name": MODEL,
+            "litellm_params": {"model": MODEL, "max_parallel_requests": LLM_MAX_PARALLEL_REQUESTS},
+        }
+    ],
+    num_retries=2,
+    timeout=60,
+)
+_in_flight: dict[str, asyncio.Task[RecommendationResponse]] = {}
+# hostname -> expiry on the monotonic clock. Only blocked verdicts are cached: getaddrinfo exposes no record TTL,
+# and caching an allowed name would let a rebinding DNS answer point it at an internal address.
+_blocked_hosts: dict[str, float] = {}
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            # Runs for every request httpx sends, including each redirect hop.
+            event_hooks={"request": [_check_request_target]},
+            timeout=30.0,
+            http2=True,
+            # Idle connections are kept longer than httpx's 5 s default, so repeat hosts skip DNS and TLS setup.
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60.0),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled HTTP client, if one was created."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    await close_http_client()
 
-app = FastAPI(title="SearchMark API", version="0.1.0")
 
-litellm.enable_json_schema_validation = True
+app = FastAPI(title="SearchMark API", version="0.1.0", lifespan=lifespan)
+
+
+# Static bodies are serialized once; these endpoints are hit far more often than /recommend.
+_WELCOME_BODY = orjson.dumps({
+    "name": app.title,
+    "version": app.version,
+    "description": "API for SearchMark bookmark search and management",
+})
+_HEALTH_BODY = orjson.dumps({"status": "ok"})
 
 
 @app.get("/")
-def welcome():
-    return {
-        "name": app.title,
-        "version": app.version,
-        "description": "API for SearchMark bookmark search and management",
-    }
+async def welcome() -> Response:
+    return Response(_WELCOME_BODY, media_type="application/json")
+
+
+def _is_blocked_ip(host: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    # Anything outside the public unicast space (private, loopback, link-local, CGNAT, unspecified, ...) is blocked.
+    return not ip.is_global or ip.is_multicast
 
 
 def validate_url(url: str) -> None:
@@ -41,91 +150,232 @@ def validate_url(url: str) -> None:
     parsed = urlparse(url)
     if parsed.scheme not in ("http", "https"):
         raise HTTPException(status_code=400, detail="Only http/https URLs allowed")
-    if parsed.hostname and parsed.hostname.lower() in BLOCKED_HOSTS:
+    hostname = (parsed.hostname or "").lower()
+    if hostname in BLOCKED_HOSTS or _is_blocked_ip(hostname):
         raise HTTPException(status_code=403, detail="This host is not allowed")
 
 
-async def fetch_and_analyze_url(url: str) -> AnalyzeUrlResponse:
-    validate_url(url)
+async def _resolves_to_blocked_ip(hostname: str) -> bool:
+    """Resolve `hostname` and report whether any address is blocked; blocked names are remembered for a while."""
+    now = time.monotonic()
+    expiry = _blocked_hosts.get(hostname)
+    if expiry is not None and expiry > now:
+        return True
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        # Unresolvable hosts fail on fetch with a proper error; nothing internal can be reached.
+        return False
+    if not any(_is_blocked_ip(info[4][0]) for info in infos):
+        return False
+    if len(_blocked_hosts) >= BLOCKED_HOST_CACHE_SIZE:
+        _blocked_hosts.pop(next(iter(_blocked_hosts)))
+    _blocked_hosts[hostname] = now + BLOCKED_HOST_CACHE_TTL
+    return True
 
-    cached = await cache.get_analysis(url)
-    if cached is not None:
-        return cached
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-        response = await client.get(url)
+async def _check_request_target(request: httpx.Request) -> None:
+    """Apply the SSRF rules to an outgoing request, so redirects cannot lead to internal hosts."""
+    # validate_url only sees the literal host; names that resolve into blocked ranges are rejected too.
+    validate_url(str(request.url))
+    if await _resolves_to_blocked_ip(request.url.host.lower()):
+        raise HTTPException(status_code=403, detail="This host is not allowed")
+
+
+async def _fetch_html(url: str) -> str:
+    """Fetch a page's HTML, reading at most MAX_HTML_BYTES of the body."""
+    async with _get_http_client().stream("GET", url) as response:
         response.raise_for_status()
-        html_content = response.text
+        body = bytearray()
+        async for chunk in response.aiter_bytes(chunk_size=16 * 1024):
+            body.extend(chunk)
+            if len(body) >= MAX_HTML_BYTES:
+                break
+    return _decode_html(bytes(body[:MAX_HTML_BYTES]), response.charset_encoding)
+
+
+def _decode_html(body: bytes, charset: str | None) -> str:
+    """Decode HTML using the Content-Type charset, else a <meta> charset in the first 1 KB, else UTF-8."""
+    if charset is None:
+        match = _META_CHARSET.search(body, 0, 1024)
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def _extract_text(html: str) -> str:
+    """Extract the visible text of an HTML page, without scripts, styles and navigation."""
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(NON_CONTENT_TAGS)
+    root = tree.body or tree.root
+    return root.text(separator=" ", strip=True) if root is not None else ""
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Truncate text to roughly max_tokens tokens.
+
+    litellm counts gpt-4.1 tokens with its bundled cl100k_base encoding rather than the model's o200k_base, which
+    would need a download at runtime. o200k_base is usually more compact, so the model typically sees fewer tokens.
+    """
+    # Bound the input first so tokenizing a huge page stays cheap; tokens are rarely longer than 8 characters.
+    text = text[: max_tokens * 8]
+    tokens = litellm.encode(model=MODEL, text=text)
+    if len(tokens) <= max_tokens:
+        return text
+    return litellm.decode(model=MODEL, tokens=tokens[:max_tokens])
+
+
+def _page_content(html: str) -> str:
+    return _truncate_to_tokens(_extract_text(html), MAX_CONTENT_TOKENS)
+
+
+async def _fetch_page_content(url: str) -> str:
+    html_content = await _fetch_html(url)
 
     if not html_content:
         raise HTTPException(status_code=400, detail="No content retrieved")
 
-    h = html2text.HTML2Text()
-    h.ignore_links = True
-    h.ignore_images = True
-    content = h.handle(html_content)[:15000]
+    # Parsing large pages is CPU-bound; keep it off the event loop so other requests keep flowing.
+    return await asyncio.to_thread(_page_content, html_content)
+
+
+async def fetch_and_analyze_url(url: str) -> AnalyzeUrlResponse:
+    validate_url(url)
+
+    cached = await cache.get_analysis(url)
+    if cached is not None:
+        return cached
+
+    content = await _fetch_page_content(url)
 
-    messages = [
-        {"role": "system", "content": "Analyze this web page and extract the URL, title and summary."},
+    messages: list[AllMessageValues] = [
+        _ANALYSIS_SYSTEM_MESSAGE,
         {"role": "user", "content": f"URL: {url}\n\nContent:\n{content}"},
     ]
-    response = await acompletion(model=MODEL, messages=messages, response_format=AnalyzeUrlResponse)
-    result = AnalyzeUrlResponse.model_validate_json(response.choices[0].message.content)
+    response = await _router.acompletion(model=MODEL, messages=messages, response_format=AnalyzeUrlResponse)
+    result = AnalyzeUrlResponse.model_validate_json(response.choices[0].message.content or "")
     await cache.set_analysis(url, result)
     return result
 
 
+async def _complete_with_folders(
+    system_message: ChatCompletionSystemMessage, folders_toon: str, user_content: str, response_format: type[ModelT]
+) -> ModelT:
+    # The folder tree is stable across a user's requests, so it goes before the per-page content
+    # to form a reusable prefix for the provider's prompt cache.
+    messages: list[AllMessageValues] = [
+        system_message,
+        {"role": "system", "content": f"User's Folder Structure (TOON format):\n{folders_toon}"},
+        {"role": "user", "content": user_content},
+    ]
+    response = await _router.acompletion(
+        model=MODEL,
+        messages=messages,
+        response_format=response_format,
+        prompt_cache_key=hashlib.sha256(folders_toon.encode()).hexdigest(),
+        cache_control_injection_points=_CACHE_CONTROL_INJECTION_POINTS,
+    )
+    return response_format.model_validate_json(response.choices[0].message.content or "")
+
+
+def _to_recommendation_response(
+    analysis: AnalyzeUrlResponse, result: ExistingFolderRecommendation | NewFolderRecommendation
+) -> RecommendationResponse:
+    analysis_fields = {
+        "title": analysis.title,
+        "summary": analysis.summary,
+        "reasoning": result.reasoning,
+    }
+    if isinstance(result, NewFolderRecommendation):
+        return RecommendationResponse(
+            **analysis_fields, recommended_folder=result.recommended_folder, new_folder_name=result.new_folder_name
+        )
+    return RecommendationResponse(**analysis_fields, recommended_folder=result.recommended_folder)
+
+
 async def get_folder_recommendation(
     analysis: AnalyzeUrlResponse,
-    folders_json: str,
+    folders_toon: str,
     create_new_folder: bool = False,
 ) -> RecommendationResponse:
-    """Recommend a folder based on page analysis and available folders."""
-    folders_data = json.loads(folders_json)
-    folders_toon = toon_encode(folders_data)
+    """Recommend a folder based on page analysis and the TOON-encoded folder tree."""
+    cached = await cache.get_recommendation(analysis, folders_toon, create_new_folder)
+    if cached is not None:
+        return cached
 
     human_message = f"""Webpage Analysis:
 - URL: {analysis.url}
 - Title: {analysis.title}
-- Summary: {analysis.summary}
-
-User's Folder Structure (TOON format):
-{folders_toon}"""
+- Summary: {analysis.summary}"""
 
     if create_new_folder:
-        system_prompt = NEW_FOLDER_RECOMMENDATION_PROMPT
+        system_message = _NEW_FOLDER_SYSTEM_MESSAGE
         response_format = NewFolderRecommendation
     else:
-        system_prompt = EXISTING_FOLDER_RECOMMENDATION_PROMPT
+        system_message = _EXISTING_FOLDER_SYSTEM_MESSAGE
         response_format = ExistingFolderRecommendation
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": human_message},
-    ]
-    response = await acompletion(model=MODEL, messages=messages, response_format=response_format)
-    result = response_format.model_validate_json(response.choices[0].message.content)
+    result = await _complete_with_folders(system_message, folders_toon, human_message, response_format)
+    recommendation = _to_recommendation_response(analysis, result)
+    await cache.set_recommendation(analysis, folders_toon, create_new_folder, recommendation)
+    return recommendation
 
-    analysis_fields = {
-        "title": analysis.title,
-        "summary": analysis.summary,
-        "reasoning": result.reasoning,
-    }
-    if isinstance(result, NewFolderRecommendation):
-        return RecommendationResponse(
-            **analysis_fields, recommended_folder=result.recommended_folder, new_folder_name=result.new_folder_name
-        )
-    return RecommendationResponse(**analysis_fields, recommended_folder=result.recommended_folder)
+
+async def analyze_and_recommend(
+    url: str,
+    content: str,
+    folders_toon: str,
+    create_new_folder: bool = False,
+) -> RecommendationResponse:
+    """Analyze page content and recommend a folder in a single LLM call, caching both results."""
+    if create_new_folder:
+        system_message = _FUSED_NEW_FOLDER_SYSTEM_MESSAGE
+        response_format = FusedNewFolderRecommendation
+    else:
+        system_message = _FUSED_EXISTING_FOLDER_SYSTEM_MESSAGE
+        response_format = FusedExistingFolderRecommendation
+
+    result = await _complete_with_folders(
+        system_message, folders_toon, f"URL: {url}\n\nContent:\n{content}", response_format
+    )
+    recommendation = _to_recommendation_response(result.analysis, result.recommendation)
+    await cache.set_analysis(url, result.analysis)
+    await cache.set_recommendation(result.analysis, folders_toon, create_new_folder, recommendation)
+    return recommendation
+
+
+async def recommend_url(url: str, folders: list[Folder], create_new_folder: bool = False) -> RecommendationResponse:
+    """Recommend a folder for a URL, reusing a cached analysis or analyzing and recommending in one LLM call."""
+    validate_url(url)
+
+    analysis = await cache.get_analysis(url)
+    if analysis is not None:
+        folders_toon = await asyncio.to_thread(folders_to_toon, folders)
+        return await get_folder_recommendation(analysis, folders_toon, create_new_folder)
+
+    # Encode the folder tree off the event loop while the page is fetched.
+    content, folders_toon = await asyncio.gather(
+        _fetch_page_content(url),
+        asyncio.to_thread(folders_to_toon, folders),
+    )
+    return await analyze_and_recommend(url, content, folders_toon, create_new_folder)
 
 
 @app.post("/recommend", response_model=RecommendationResponse)
 async def recommend_folder(request: AnalyseUrlRequest) -> RecommendationResponse:
-    analysis = await fetch_and_analyze_url(request.url)
-    folders_json = json.dumps([f.model_dump() for f in request.folders])
-    recommendation = await get_folder_recommendation(analysis, folders_json, request.create_new_folder)
-    return recommendation
+    # Identical requests already in flight share one fetch and one LLM call.
+    key = hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(recommend_url(request.url, request.folders, request.create_new_folder))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # Shielded so a client disconnecting does not cancel the work other callers are awaiting.
+    return await asyncio.shield(task)
 
 
 @app.get("/health")
-def health_check():
-    return {"status": "ok"}
+async def health_check() -> Response:
+    return Response(_HEALTH_BODY, media_type="application/json")
@@ -1,37 +1,163 @@
-import json
+import codecs
+import functools
+import hashlib
+import html
+import re
+import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any
 
+import charset_normalizer
+import orjson
+from pydantic import TypeAdapter
+from toon import encode as toon_encode
+
 from app.schemas.analyze import Folder
 
 MOZ_FOLDER_TYPE = "text/x-moz-place-container"
+NETSCAPE_SUFFIXES = frozenset({".htm", ".html"})
+_SNIFF_BYTES = 4096
+_WIDE_BOMS = (codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+# Only the folder name is captured: a group around the other alternatives disables re's literal-prefix
+# scan and makes matching an order of magnitude slower.
+_NETSCAPE_TOKENS = re.compile(rb"<H3\b[^>]*>([^<]*)</H3>|<DL\b|</DL>", re.IGNORECASE)
+
+_FOLDERS_ADAPTER = TypeAdapter(list[Folder])
+
+TOON_CACHE_SIZE = 128
+# sha256(folders JSON) -> TOON; folders_to_toon runs in worker threads, hence the lock.
+_toon_cache: OrderedDict[bytes, str] = OrderedDict()
+_toon_cache_lock = threading.Lock()
 
 
 def parse_bookmarks_file(path: str | Path) -> list[Folder]:
-    path = Path(path)
-    data = json.loads(path.read_text(encoding="utf-8"))
+    # Unchanged files are served from the cache; the returned list is shared, so callers must not mutate it.
+    path = Path(path).resolve()
+    stat = path.stat()
+    return _parse_bookmarks_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_bookmarks_file(path: Path, mtime_ns: int, size: int) -> list[Folder]:
+    raw = path.read_bytes()
+    if _is_wide_encoding(raw):
+        # Neither the byte sniff nor the bytes scan can see ASCII markup in UTF-16/32, so convert up front.
+        raw = _to_utf8(raw)
+
+    if path.suffix.lower() in NETSCAPE_SUFFIXES or _is_markup(raw):
+        # Only folder names are decoded, so UTF-8 exports skip a full-file decode; legacy ones retry converted.
+        try:
+            return parse_netscape_html(raw)
+        except UnicodeDecodeError:
+            return parse_netscape_html(_to_utf8(raw))
+
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # Retry exports with a BOM or a legacy encoding; still-invalid JSON raises again.
+        data = orjson.loads(_to_utf8(raw))
 
     if isinstance(data, dict) and data.get("type") == MOZ_FOLDER_TYPE:
         return _moz_children_to_folders(data)
 
     items = data.get("folders", data) if isinstance(data, dict) else data
-    return [Folder.model_validate(item) for item in items]
+    return _FOLDERS_ADAPTER.validate_python(items)
+
+
+def _is_wide_encoding(raw: bytes) -> bool:
+    head = raw[:_SNIFF_BYTES]
+    return head.startswith(_WIDE_BOMS) or b"\0" in head
+
+
+def _is_markup(raw: bytes) -> bool:
+    # JSON exports open with `{` or `[`, HTML ones with `<`, so the first non-space byte picks the parser.
+    return raw[:_SNIFF_BYTES].removeprefix(codecs.BOM_UTF8).lstrip()[:1] == b"<"
 
 
-def _moz_children_to_folders(node: dict[str, Any]) -> list[Folder]:
+def _to_utf8(raw: bytes) -> bytes:
+    """Return bookmark file bytes as BOM-less UTF-8, detecting the encoding of non-UTF-8 exports."""
+    if raw.startswith(codecs.BOM_UTF8):
+        return raw[len(codecs.BOM_UTF8) :]
+    # BOM-less UTF-16/32 ASCII is also valid UTF-8 (NUL is a valid byte), so it must skip the validity check.
+    if not _is_wide_encoding(raw):
+        try:
+            raw.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+        else:
+            return raw
+    match = charset_normalizer.from_bytes(raw).best()
+    return match.output("utf-8") if match is not None else raw
+
+
+def _moz_children_to_folders(root: dict[str, Any]) -> list[Folder]:
+    # Walk with an explicit stack so deeply nested exports cannot hit the recursion limit.
+    # Names like "New Folder" repeat across large exports, so they are interned to share one string.
     folders: list[Folder] = []
-    for child in node.get("children") or []:
-        if child.get("type") != MOZ_FOLDER_TYPE:
-            continue
-        folders.append(
-            Folder(
-                id=child.get("guid") or "",
-                name=child.get("title") or "",
-                children=_moz_children_to_folders(child),
-            )
-        )
+    stack: list[tuple[dict[str, Any], list[Folder]]] = [(root, folders)]
+    while stack:
+        node, siblings = stack.pop()
+        for child in node.get("children") or []:
+            if child.get("type") != MOZ_FOLDER_TYPE:
+                continue
+            folder = Folder(id=child.get("guid") or "", name=sys.intern(child.get("title") or ""))
+            siblings.append(folder)
+            stack.append((child, folder.children))
+    return folders
+
+
+def parse_netscape_html(content: str | bytes) -> list[Folder]:
+    """Parse a Netscape bookmark export (the HTML format written by every major browser).
+
+    The format is rigid: a folder is `<DT><H3>name</H3>` followed by its `<DL>...</DL>`, so a single
+    regex pass with a stack of open folder lists recovers the tree without building a DOM.
+    Exports carry no folder ids, so folders are numbered in document order.
+    Bytes must be UTF-8; only the folder names are decoded.
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    folders: list[Folder] = []
+    stack = [folders]
+    heading: Folder | None = None
+    count = 0
+    for match in _NETSCAPE_TOKENS.finditer(content):
+        name = match[1]
+        if name is not None:
+            count += 1
+            heading = Folder(id=str(count), name=sys.intern(html.unescape(name.decode().strip())))
+            stack[-1].append(heading)
+        elif not content.startswith(b"</", match.start()):
+            # A list without a heading (the root, or malformed input) keeps adding to the current level.
+            stack.append(heading.children if heading is not None else stack[-1])
+            heading = None
+        else:
+            heading = None
+            if len(stack) > 1:
+                stack.pop()
     return folders
 
 
 def folders_to_json(folders: list[Folder]) -> str:
-    return json.dumps([f.model_dump() for f in folders], indent=2)
+    return _FOLDERS_ADAPTER.dump_json(folders, indent=2).decode()
+
+
+def folders_to_toon(folders: list[Folder]) -> str:
+    # Serializing to JSON in pydantic-core is much cheaper than TOON encoding, so its digest is the cache key.
+    # Only the digest is kept: folder trees come from request bodies and can be arbitrarily large.
+    folders_json = _FOLDERS_ADAPTER.dump_json(folders)
+    key = hashlib.sha256(folders_json).digest()
+    with _toon_cache_lock:
+        toon = _toon_cache.get(key)
+        if toon is not None:
+            _toon_cache.move_to_end(key)
+            return toon
+
+    toon = toon_encode(orjson.loads(folders_json))
+    with _toon_cache_lock:
+        _toon_cache[key] = toon
+        if len(_toon_cache) > TOON_CACHE_SIZE:
+            _toon_cache.popitem(last=False)
+    return toon
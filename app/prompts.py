@@ -1,3 +1,5 @@
+ANALYSIS_PROMPT = "Analyze this web page and extract the URL, title and summary."
+
 EXISTING_FOLDER_RECOMMENDATION_PROMPT = """
 You are a bookmark organization assistant. Based on the webpage analysis and the user's folder structure, recommend the best existing folder for this bookmark.
 Rules:
@@ -18,3 +20,7 @@ Rules:
 5. Consider all levels of the folder hierarchy. A folder path like "Django/Admin/Security" matching multiple aspects of the content is better than "Articles/Security" matching only one.
 6. Return the FULL path of the chosen folder exactly as it appears in the folder structure.
 """
+
+ANALYZE_PAGE_FIRST_PROMPT = """
+You are given the raw page content instead of a webpage analysis. First fill `analysis` with the page's URL, title and a summary of its content, then fill `recommendation` based on that analysis.
+"""
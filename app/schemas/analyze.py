@@ -36,6 +36,20 @@ class NewFolderRecommendation(BaseModel):
     new_folder_name: str = Field(description="Name of the new category folder to create")
 
 
+class FusedExistingFolderRecommendation(BaseModel):
+    """LLM response model when analyzing a page and selecting an existing folder in one call."""
+
+    analysis: AnalyzeUrlResponse
+    recommendation: ExistingFolderRecommendation
+
+
+class FusedNewFolderRecommendation(BaseModel):
+    """LLM response model when analyzing a page and creating a new folder in one call."""
+
+    analysis: AnalyzeUrlResponse
+    recommendation: NewFolderRecommendation
+
+
 class RecommendationResponse(BaseModel):
     title: str = Field(description="Page title")
     summary: str = Field(description="AI-generated summary of the page content")
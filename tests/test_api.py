@@ -1,8 +1,23 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import httpx
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
-from app.main import app, validate_url
+from app import main
+from app.main import _decode_html, _extract_text, _truncate_to_tokens, app, validate_url
+from app.schemas.analyze import (
+    AnalyseUrlRequest,
+    AnalyzeUrlResponse,
+    ExistingFolderRecommendation,
+    Folder,
+    FusedNewFolderRecommendation,
+    NewFolderRecommendation,
+    RecommendationResponse,
+)
 
 client = TestClient(app)
 
@@ -48,8 +63,325 @@ class TestValidateUrl:
             validate_url("http://[::1]/admin")
         assert exc_info.value.status_code == 403
 
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "http://10.0.0.1/",
+            "http://172.16.5.4/",
+            "http://192.168.1.1/router",
+            "http://169.254.169.254/latest/meta-data",
+            "http://127.0.0.2/",
+            "http://0.0.0.0/",
+            "http://[fd00::1]/",
+            "http://[::ffff:127.0.0.1]/",
+            "http://[::]:8000/",
+            "http://100.64.0.1/",
+            "http://224.0.0.1/",
+        ],
+    )
+    def test_rejects_private_ranges(self, url):
+        with pytest.raises(HTTPException) as exc_info:
+            validate_url(url)
+        assert exc_info.value.status_code == 403
+
+    def test_allows_public_ip(self):
+        validate_url("http://93.184.216.34/")  # should not raise
+
+    def test_allows_public_ipv6(self):
+        validate_url("http://[2606:4700::1]/")  # should not raise
+
+
+class TestExtractText:
+    def test_keeps_visible_text(self):
+        assert _extract_text("<html><body><p>Hello <b>world</b></p></body></html>").split() == ["Hello", "world"]
+
+    def test_drops_scripts_styles_and_navigation(self):
+        html = (
+            "<body><nav>Menu</nav><style>p{}</style><p>Article</p><script>track()</script><footer>Legal</footer></body>"
+        )
+        assert _extract_text(html).strip() == "Article"
+
+    def test_empty_document(self):
+        assert _extract_text("") == ""
+
+
+class TestTruncateToTokens:
+    def test_short_text_unchanged(self):
+        assert _truncate_to_tokens("A short page", 100) == "A short page"
+
+    def test_long_text_truncated(self):
+        text = "word " * 1000
+        result = _truncate_to_tokens(text, 50)
+        assert text.startswith(result)
+        assert len(result.split()) <= 50
+
+
+class TestDecodeHtml:
+    def test_uses_declared_charset(self):
+        assert _decode_html("café".encode("latin-1"), "latin-1") == "café"
+
+    def test_falls_back_to_meta_charset(self):
+        html = '<html><head><meta charset="windows-1252"></head><body>café</body></html>'
+        assert "café" in _decode_html(html.encode("cp1252"), None)
+
+    def test_defaults_to_utf8(self):
+        assert _decode_html("café".encode(), None) == "café"
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        assert _decode_html("café".encode(), "not-a-charset") == "café"
+
+
+class TestHttpClient:
+    def test_client_is_reused_until_closed(self):
+        first = main._get_http_client()
+        assert main._get_http_client() is first
+        asyncio.run(main.close_http_client())
+        assert first.is_closed
+        assert main._get_http_client() is not first
+        asyncio.run(main.close_http_client())
+
+
+class TestFetchHtml:
+    def _mock_client(self, monkeypatch, response):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response))
+        monkeypatch.setattr(main, "_http_client", client)
+
+    def test_decodes_body(self, monkeypatch):
+        self._mock_client(
+            monkeypatch,
+            httpx.Response(
+                200, content="<p>café</p>".encode("latin-1"), headers={"content-type": "text/html; charset=latin-1"}
+            ),
+        )
+        assert asyncio.run(main._fetch_html("https://example.com")) == "<p>café</p>"
+
+    def test_caps_body_size(self, monkeypatch):
+        self._mock_client(monkeypatch, httpx.Response(200, content=b"a" * (main.MAX_HTML_BYTES * 2)))
+        assert len(asyncio.run(main._fetch_html("https://example.com"))) == main.MAX_HTML_BYTES
+
+    def test_raises_on_error_status(self, monkeypatch):
+        self._mock_client(monkeypatch, httpx.Response(404))
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(main._fetch_html("https://example.com"))
+
+
+class TestRequestTargetCheck:
+    def _resolve(self, monkeypatch, addresses):
+        lookups = []
+
+        def fake_getaddrinfo(host, *args, **kwargs):
+            lookups.append(host)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (addresses.get(host, host), 0))]
+
+        monkeypatch.setattr(socket, "getaddrinfo", fake_getaddrinfo)
+        monkeypatch.setattr(main, "_blocked_hosts", {})
+        return lookups
+
+    def _redirecting_client(self, location, seen):
+        def handler(request):
+            seen.append(request.url.host)
+            if request.url.host == "example.com":
+                return httpx.Response(302, headers={"location": location})
+            return httpx.Response(200, text="secret")
+
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(handler),
+            follow_redirects=True,
+            event_hooks={"request": [main._check_request_target]},
+        )
+
+    def test_private_address_is_blocked(self, monkeypatch):
+        self._resolve(monkeypatch, {"internal.example.com": "10.0.0.5"})
+        assert asyncio.run(main._resolves_to_blocked_ip("internal.example.com"))
+
+    def test_public_address_is_allowed(self, monkeypatch):
+        self._resolve(monkeypatch, {"example.com": "93.184.216.34"})
+        assert not asyncio.run(main._resolves_to_blocked_ip("example.com"))
+
+    def test_blocked_answers_are_cached(self, monkeypatch):
+        lookups = self._resolve(monkeypatch, {"internal.example.com": "10.0.0.5"})
+        asyncio.run(main._resolves_to_blocked_ip("internal.example.com"))
+        asyncio.run(main._resolves_to_blocked_ip("internal.example.com"))
+        assert lookups == ["internal.example.com"]
+
+    def test_allowed_answers_are_not_cached(self, monkeypatch):
+        lookups = self._resolve(monkeypatch, {"example.com": "93.184.216.34"})
+        asyncio.run(main._resolves_to_blocked_ip("example.com"))
+        asyncio.run(main._resolves_to_blocked_ip("example.com"))
+        assert lookups == ["example.com", "example.com"]
+
+    def test_unresolvable_host_is_not_blocked(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise socket.gaierror
+
+        monkeypatch.setattr(socket, "getaddrinfo", fail)
+        monkeypatch.setattr(main, "_blocked_hosts", {})
+        assert not asyncio.run(main._resolves_to_blocked_ip("nonexistent.invalid"))
+
+    def test_pooled_client_checks_every_request(self, monkeypatch):
+        monkeypatch.setattr(main, "_http_client", None)
+        client = main._get_http_client()
+        assert client.follow_redirects
+        assert main._check_request_target in client.event_hooks["request"]
+        asyncio.run(main.close_http_client())
+
+    @pytest.mark.parametrize(
+        "location",
+        ["http://169.254.169.254/latest/meta-data", "http://localhost:6379/", "http://internal.example.com/"],
+    )
+    def test_redirect_to_internal_host_is_rejected(self, monkeypatch, location):
+        self._resolve(monkeypatch, {"example.com": "93.184.216.34", "internal.example.com": "10.0.0.5"})
+        seen = []
+        monkeypatch.setattr(main, "_http_client", self._redirecting_client(location, seen))
+
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(main._fetch_html("https://example.com/"))
+        assert exc.value.status_code == 403
+        assert seen == ["example.com"]
+
+    def test_redirect_to_public_host_is_followed(self, monkeypatch):
+        self._resolve(monkeypatch, {"example.com": "93.184.216.34", "example.org": "93.184.216.35"})
+        seen = []
+        monkeypatch.setattr(main, "_http_client", self._redirecting_client("https://example.org/", seen))
+
+        assert asyncio.run(main._fetch_html("https://example.com/")) == "secret"
+        assert seen == ["example.com", "example.org"]
+
+
+ANALYSIS = AnalyzeUrlResponse(url="https://example.com", title="Example", summary="A summary")
+
+
+def _completion_returning(result, calls):
+    async def fake_completion(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=result.model_dump_json()))])
+
+    return fake_completion
+
+
+@pytest.fixture
+def empty_cache(monkeypatch):
+    stored = []
+
+    async def miss(*args):
+        return None
+
+    async def store(*args):
+        stored.append(args)
+
+    for name in ("get_analysis", "get_recommendation"):
+        monkeypatch.setattr(main.cache, name, miss)
+    for name in ("set_analysis", "set_recommendation"):
+        monkeypatch.setattr(main.cache, name, store)
+    return stored
+
+
+class TestGetFolderRecommendation:
+    def test_folder_tree_precedes_page_analysis(self, monkeypatch, empty_cache):
+        calls = []
+        result = ExistingFolderRecommendation(reasoning="Fits", recommended_folder="Dev")
+        monkeypatch.setattr(main._router, "acompletion", _completion_returning(result, calls))
+
+        recommendation = asyncio.run(main.get_folder_recommendation(ANALYSIS, "folders-toon"))
+
+        assert recommendation.recommended_folder == "Dev"
+        messages = calls[0]["messages"]
+        assert [m["role"] for m in messages] == ["system", "system", "user"]
+        assert "folders-toon" in messages[1]["content"]
+        assert "https://example.com" in messages[2]["content"]
+        assert calls[0]["cache_control_injection_points"] == [{"location": "message", "role": "system"}]
+
+
+class TestAnalyzeAndRecommend:
+    def test_single_call_returns_and_caches_both_results(self, monkeypatch, empty_cache):
+        calls = []
+        result = FusedNewFolderRecommendation(
+            analysis=ANALYSIS,
+            recommendation=NewFolderRecommendation(
+                reasoning="New topic", recommended_folder="Dev", new_folder_name="Rust"
+            ),
+        )
+        monkeypatch.setattr(main._router, "acompletion", _completion_returning(result, calls))
+
+        recommendation = asyncio.run(
+            main.analyze_and_recommend("https://example.com", "Page text", "folders-toon", create_new_folder=True)
+        )
+
+        assert len(calls) == 1
+        assert calls[0]["response_format"] is FusedNewFolderRecommendation
+        assert "Page text" in calls[0]["messages"][2]["content"]
+        assert recommendation.title == "Example"
+        assert recommendation.new_folder_name == "Rust"
+        assert ("https://example.com", ANALYSIS) in empty_cache
+        assert (ANALYSIS, "folders-toon", True, recommendation) in empty_cache
+
+
+class TestRecommendUrl:
+    def test_fetches_and_uses_fused_call_on_cache_miss(self, monkeypatch, empty_cache):
+        async def fake_content(url):
+            return "Page text"
+
+        async def fake_fused(url, content, folders_toon, create_new_folder=False):
+            assert content == "Page text"
+            assert "Dev" in folders_toon
+            return RecommendationResponse(
+                title="Example", summary="A summary", reasoning="Fits", recommended_folder="Dev"
+            )
+
+        monkeypatch.setattr(main, "_fetch_page_content", fake_content)
+        monkeypatch.setattr(main, "analyze_and_recommend", fake_fused)
+        result = asyncio.run(main.recommend_url("https://example.com", [Folder(id="1", name="Dev")]))
+        assert result.recommended_folder == "Dev"
+
+    def test_reuses_cached_analysis(self, monkeypatch):
+        async def cached_analysis(url):
+            return ANALYSIS
+
+        async def fake_recommend(analysis, folders_toon, create_new_folder=False):
+            assert analysis == ANALYSIS
+            return RecommendationResponse(
+                title="Example", summary="A summary", reasoning="Fits", recommended_folder="Dev"
+            )
+
+        monkeypatch.setattr(main.cache, "get_analysis", cached_analysis)
+        monkeypatch.setattr(main, "get_folder_recommendation", fake_recommend)
+        result = asyncio.run(main.recommend_url("https://example.com", []))
+        assert result.recommended_folder == "Dev"
+
 
 class TestRecommendEndpoint:
     def test_missing_url(self):
         resp = client.post("/recommend", json={})
         assert resp.status_code == 422
+
+    def test_recommend_passes_folders(self, monkeypatch):
+        async def fake_recommend_url(url, folders, create_new_folder=False):
+            assert folders[0].name == "Dev"
+            return RecommendationResponse(
+                title="Example", summary="A summary", reasoning="Fits", recommended_folder="Dev"
+            )
+
+        monkeypatch.setattr(main, "recommend_url", fake_recommend_url)
+        resp = client.post("/recommend", json={"url": "https://example.com", "folders": [{"id": "1", "name": "Dev"}]})
+        assert resp.status_code == 200
+        assert resp.json()["recommended_folder"] == "Dev"
+
+    def test_identical_concurrent_requests_share_work(self, monkeypatch):
+        requested = []
+
+        async def fake_recommend_url(url, folders, create_new_folder=False):
+            requested.append(url)
+            await asyncio.sleep(0.01)
+            return RecommendationResponse(
+                title="Example", summary="A summary", reasoning="Fits", recommended_folder="Dev"
+            )
+
+        async def run():
+            request = AnalyseUrlRequest(url="https://example.com")
+            return await asyncio.gather(main.recommend_folder(request), main.recommend_folder(request))
+
+        monkeypatch.setattr(main, "recommend_url", fake_recommend_url)
+        first, second = asyncio.run(run())
+        assert first == second
+        assert requested == ["https://example.com"]
+        assert main._in_flight == {}
@@ -1,4 +1,7 @@
-from app.cache import _cache_key
+from app.cache import _cache_key, _normalize_url, _recommendation_key
+from app.schemas.analyze import AnalyzeUrlResponse
+
+ANALYSIS = AnalyzeUrlResponse(url="https://example.com", title="Example", summary="A summary")
 
 
 class TestCacheKey:
@@ -10,3 +13,41 @@ class TestCacheKey:
 
     def test_prefix(self):
         assert _cache_key("https://example.com").startswith("analysis:")
+
+    def test_equivalent_urls_share_key(self):
+        assert _cache_key("https://Example.com:443/page?utm_source=x#top") == _cache_key("https://example.com/page")
+
+
+class TestNormalizeUrl:
+    def test_lowercases_scheme_and_host(self):
+        assert _normalize_url("HTTPS://Example.COM/Path") == "https://example.com/Path"
+
+    def test_drops_default_port_and_fragment(self):
+        assert _normalize_url("http://example.com:80/a#section") == "http://example.com/a"
+
+    def test_keeps_non_default_port(self):
+        assert _normalize_url("http://example.com:8080/") == "http://example.com:8080/"
+
+    def test_empty_path_becomes_root(self):
+        assert _normalize_url("https://example.com") == "https://example.com/"
+
+    def test_strips_tracking_params_and_sorts_query(self):
+        url = "https://example.com/?b=2&utm_medium=mail&a=1&fbclid=abc"
+        assert _normalize_url(url) == "https://example.com/?a=1&b=2"
+
+    def test_keeps_ipv6_brackets(self):
+        assert _normalize_url("http://[2001:db8::1]:8080/") == "http://[2001:db8::1]:8080/"
+
+
+class TestRecommendationKey:
+    def test_deterministic(self):
+        assert _recommendation_key(ANALYSIS, "folders", False) == _recommendation_key(ANALYSIS, "folders", False)
+
+    def test_depends_on_folders(self):
+        assert _recommendation_key(ANALYSIS, "a", False) != _recommendation_key(ANALYSIS, "b", False)
+
+    def test_depends_on_create_new_folder(self):
+        assert _recommendation_key(ANALYSIS, "folders", False) != _recommendation_key(ANALYSIS, "folders", True)
+
+    def test_prefix(self):
+        assert _recommendation_key(ANALYSIS, "folders", False).startswith("recommendation:")
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from typer.testing import CliRunner
+
+from app import main
+from app.cli import app
+from app.schemas.analyze import RecommendationResponse
+
+runner = CliRunner()
+
+
+RECOMMENDATION = RecommendationResponse(
+    title="Example", summary="A summary", recommended_folder="Dev", reasoning="Fits"
+)
+
+
+class FetchError(Exception):
+    def __init__(self) -> None:
+        super().__init__("fetch failed")
+
+
+class TestRecommendBatch:
+    def _invoke(self, tmp_path, urls, *flags):
+        urls_file = tmp_path / "urls.txt"
+        urls_file.write_text("\n".join(urls) + "\n\n")
+        bookmarks = tmp_path / "bookmarks.json"
+        bookmarks.write_text(json.dumps([{"id": "1", "name": "Dev"}]))
+        return runner.invoke(app, ["recommend-batch", "-u", str(urls_file), "-b", str(bookmarks), *flags])
+
+    def test_failures_are_reported_without_aborting_the_batch(self, monkeypatch, tmp_path):
+        async def fake_recommend_url(url, folders, create_new_folder=False):
+            if "broken" in url:
+                raise FetchError
+            return RECOMMENDATION
+
+        monkeypatch.setattr(main, "recommend_url", fake_recommend_url)
+
+        result = self._invoke(tmp_path, ["https://example.com/", "https://broken.example.com/"])
+
+        assert result.exit_code == 0
+        lines = {line["url"]: line for line in map(json.loads, result.stdout.splitlines())}
+        assert set(lines) == {"https://example.com/", "https://broken.example.com/"}
+        assert lines["https://example.com/"]["recommended_folder"] == "Dev"
+        assert lines["https://broken.example.com/"] == {"url": "https://broken.example.com/", "error": "fetch failed"}
+
+    def test_concurrency_is_bounded(self, monkeypatch, tmp_path):
+        active = peak = 0
+
+        async def fake_recommend_url(url, folders, create_new_folder=False):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return RECOMMENDATION
+
+        monkeypatch.setattr(main, "recommend_url", fake_recommend_url)
+
+        result = self._invoke(tmp_path, [f"https://example.com/{i}" for i in range(6)], "--concurrency", "2")
+
+        assert result.exit_code == 0
+        assert len(result.stdout.splitlines()) == 6
+        assert peak == 2
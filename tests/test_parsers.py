@@ -1,6 +1,10 @@
 import json
+from collections import OrderedDict
 
-from app.parsers import folders_to_json, parse_bookmarks_file
+import pytest
+
+from app import parsers
+from app.parsers import folders_to_json, folders_to_toon, parse_bookmarks_file, parse_netscape_html
 from app.schemas.analyze import Folder
 
 
@@ -70,6 +74,169 @@ class TestParseBookmarksFile:
         assert folders[0].children[0].name == "Dev"
         assert folders[0].children[0].children == []
 
+    def test_firefox_places_keeps_sibling_order(self, tmp_path):
+        data = {
+            "type": "text/x-moz-place-container",
+            "children": [
+                {"guid": "a", "title": "A", "type": "text/x-moz-place-container", "children": []},
+                {"guid": "b", "title": "B", "type": "text/x-moz-place-container"},
+                {"guid": "c", "title": "C", "type": "text/x-moz-place-container", "children": []},
+            ],
+        }
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps(data))
+
+        assert [f.name for f in parse_bookmarks_file(path)] == ["A", "B", "C"]
+
+    def test_unchanged_file_is_parsed_once(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps([{"id": "1", "name": "Dev"}]))
+
+        assert parse_bookmarks_file(path) is parse_bookmarks_file(str(path))
+
+    def test_modified_file_is_reparsed(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps([{"id": "1", "name": "Dev"}]))
+        parse_bookmarks_file(path)
+        path.write_text(json.dumps([{"id": "1", "name": "Development"}]))
+
+        assert parse_bookmarks_file(path)[0].name == "Development"
+
+
+NETSCAPE_EXPORT = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><H3 ADD_DATE="1700000000">Dev</H3>
+    <DL><p>
+        <DT><A HREF="https://example.com">Example</A>
+        <DT><H3>Python</H3>
+        <DL><p>
+        </DL><p>
+    </DL><p>
+    <DT><H3>News &amp; Media</H3>
+    <DL><p>
+    </DL><p>
+    <DT><A HREF="https://example.org">Loose link</A>
+</DL><p>
+"""
+
+
+class TestParseNetscapeHtml:
+    def test_nested_folders(self):
+        folders = parse_netscape_html(NETSCAPE_EXPORT)
+        assert [f.name for f in folders] == ["Dev", "News & Media"]
+        assert [f.name for f in folders[0].children] == ["Python"]
+        assert folders[0].children[0].children == []
+
+    def test_ids_are_unique(self):
+        folders = parse_netscape_html(NETSCAPE_EXPORT)
+        ids = [folders[0].id, folders[1].id, folders[0].children[0].id]
+        assert len(set(ids)) == 3
+
+    def test_lowercase_tags_and_folder_without_list(self):
+        content = "<dl><p><dt><h3>Empty</h3><dt><h3>Dev</h3><dl><p><dt><h3>Python</h3></dl><p></dl>"
+        folders = parse_netscape_html(content.encode())
+        assert [f.name for f in folders] == ["Empty", "Dev"]
+        assert folders[0].children == []
+        assert [f.name for f in folders[1].children] == ["Python"]
+
+    def test_repeated_names_share_one_string(self):
+        content = "<DL><p><DT><H3>New Folder</H3><DL><p></DL><p><DT><H3>New Folder</H3><DL><p></DL><p></DL>"
+        first, second = parse_netscape_html(content)
+        assert first.name is second.name
+
+    def test_non_utf8_names_raise(self):
+        with pytest.raises(UnicodeDecodeError):
+            parse_netscape_html("<DL><p><DT><H3>Café</H3></DL>".encode("cp1252"))
+
+    def test_no_folders(self):
+        assert parse_netscape_html("<html><body><p>nothing</p></body></html>") == []
+
+    def test_parse_bookmarks_file_detects_html(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        path.write_text(NETSCAPE_EXPORT, encoding="utf-8")
+
+        folders = parse_bookmarks_file(path)
+        assert [f.name for f in folders] == ["Dev", "News & Media"]
+
+    def test_parse_bookmarks_file_detects_markup_without_doctype(self, tmp_path):
+        path = tmp_path / "bookmarks.txt"
+        path.write_bytes(b"\xef\xbb\xbf\n  <DL><p><DT><H3>Dev</H3><DL><p></DL><p></DL>")
+
+        assert [f.name for f in parse_bookmarks_file(path)] == ["Dev"]
+
+    def test_parse_bookmarks_file_detects_doctype(self, tmp_path):
+        path = tmp_path / "bookmarks.export"
+        path.write_text(NETSCAPE_EXPORT, encoding="utf-8")
+
+        folders = parse_bookmarks_file(path)
+        assert [f.name for f in folders] == ["Dev", "News & Media"]
+
+
+ACCENTED_NAME = "Cafés et restaurants préférés"
+
+
+class TestParseBookmarksFileEncodings:
+    def test_utf8_bom(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_bytes(
+            b"\xef\xbb\xbf" + json.dumps([{"id": "1", "name": ACCENTED_NAME}], ensure_ascii=False).encode()
+        )
+
+        assert parse_bookmarks_file(path)[0].name == ACCENTED_NAME
+
+    def test_utf16(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_text(json.dumps([{"id": "1", "name": ACCENTED_NAME}], ensure_ascii=False), encoding="utf-16")
+
+        assert parse_bookmarks_file(path)[0].name == ACCENTED_NAME
+
+    def test_utf16_html(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        path.write_text(NETSCAPE_EXPORT.replace("Dev", ACCENTED_NAME), encoding="utf-16")
+
+        assert [f.name for f in parse_bookmarks_file(path)] == [ACCENTED_NAME, "News & Media"]
+
+    def test_bomless_utf16_html(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        # ASCII-only, so the bytes are also valid UTF-8 and only the NULs give the encoding away.
+        path.write_bytes(NETSCAPE_EXPORT.encode("utf-16-le"))
+
+        assert [f.name for f in parse_bookmarks_file(path)] == ["Dev", "News & Media"]
+
+    def test_bomless_utf32_html(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        path.write_bytes(NETSCAPE_EXPORT.encode("utf-32-le"))
+
+        assert [f.name for f in parse_bookmarks_file(path)] == ["Dev", "News & Media"]
+
+    def test_bomless_utf16_json(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_bytes(json.dumps([{"id": "1", "name": "Dev"}]).encode("utf-16-le"))
+
+        assert parse_bookmarks_file(path)[0].name == "Dev"
+
+    def test_utf16_html_without_suffix(self, tmp_path):
+        path = tmp_path / "bookmarks.export"
+        path.write_text(NETSCAPE_EXPORT, encoding="utf-16")
+
+        assert [f.name for f in parse_bookmarks_file(path)] == ["Dev", "News & Media"]
+
+    def test_legacy_encoded_html(self, tmp_path):
+        path = tmp_path / "bookmarks.html"
+        path.write_bytes(NETSCAPE_EXPORT.replace("Dev", "Développement économique").encode("cp1252"))
+
+        assert parse_bookmarks_file(path)[0].name == "Développement économique"
+
+    def test_invalid_json_still_raises(self, tmp_path):
+        path = tmp_path / "bookmarks.json"
+        path.write_bytes(b"{not json")
+
+        with pytest.raises(ValueError):
+            parse_bookmarks_file(path)
+
 
 class TestFoldersToJson:
     def test_roundtrip(self):
@@ -77,3 +244,39 @@ class TestFoldersToJson:
         result = json.loads(folders_to_json(folders))
         assert result[0]["name"] == "Dev"
         assert result[0]["children"][0]["name"] == "Python"
+
+
+class TestFoldersToToon:
+    def test_contains_nested_names(self):
+        folders = [Folder(id="1", name="Dev", children=[Folder(id="2", name="Python")])]
+        result = folders_to_toon(folders)
+        assert "Dev" in result
+        assert "Python" in result
+
+    def test_empty(self):
+        assert isinstance(folders_to_toon([]), str)
+
+    def test_same_tree_is_encoded_once(self, monkeypatch):
+        calls = []
+
+        def counting_encode(value):
+            calls.append(value)
+            return "toon"
+
+        monkeypatch.setattr(parsers, "toon_encode", counting_encode)
+        monkeypatch.setattr(parsers, "_toon_cache", OrderedDict())
+        folders_to_toon([Folder(id="1", name="Dev")])
+        assert folders_to_toon([Folder(id="1", name="Dev")]) == "toon"
+        assert len(calls) == 1
+
+    def test_cache_keeps_digests_not_trees(self, monkeypatch):
+        monkeypatch.setattr(parsers, "_toon_cache", OrderedDict())
+        folders_to_toon([Folder(id="1", name="Dev")])
+        assert [len(key) for key in parsers._toon_cache] == [32]
+
+    def test_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(parsers, "_toon_cache", OrderedDict())
+        monkeypatch.setattr(parsers, "TOON_CACHE_SIZE", 2)
+        for i in range(3):
+            folders_to_toon([Folder(id=str(i), name="Dev")])
+        assert len(parsers._toon_cache) == 2
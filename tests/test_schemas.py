@@ -6,6 +6,7 @@ from app.schemas.analyze import (
     AnalyzeUrlResponse,
     ExistingFolderRecommendation,
     Folder,
+    FusedExistingFolderRecommendation,
     NewFolderRecommendation,
     RecommendationResponse,
 )
@@ -81,3 +82,10 @@ class TestLLMResponseModels:
     def test_new_folder_recommendation(self):
         r = NewFolderRecommendation(reasoning="New topic", recommended_folder="Dev", new_folder_name="Rust")
         assert r.new_folder_name == "Rust"
+
+    def test_fused_recommendation_roundtrip_json(self):
+        r = FusedExistingFolderRecommendation(
+            analysis=AnalyzeUrlResponse(url="https://example.com", title="Example", summary="A summary"),
+            recommendation=ExistingFolderRecommendation(reasoning="Good fit", recommended_folder="Dev/Python"),
+        )
+        assert FusedExistingFolderRecommendation.model_validate_json(r.model_dump_json()) == r